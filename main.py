@@ -1,10 +1,32 @@
 from fastapi import FastAPI, Query, Request, Response
-from fastapi.responses import HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import Dict, Any, List, Optional, Tuple
-import requests, time, csv, io as iolib
-from datetime import datetime, timezone
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Deque, List, Optional, Tuple
+import asyncio, httpx, logging, os, time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+    _JSONResponse = ORJSONResponse
+except ImportError:  # stdlib fallback
+    import json
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    _JSONResponse = JSONResponse
+
+try:
+    import ijson
+except ImportError:  # history is then parsed in one go
+    ijson = None
 
 """
 LR2-style web app (FastAPI + Jinja2 + HTML/CSS/JS) for CoinGecko WITHOUT API key.
@@ -17,14 +39,21 @@ UI provides:
 
 API provides:
 GET  /cg/top
+GET  /cg/top/search
 GET  /cg/price
+GET  /cg/prices
 GET  /cg/convert
 GET  /cg/top.csv
 GET  /cg/history
+GET  /cg/coin_ids
 
 Run:
   pip install -r requirements.txt
   uvicorn main:app --reload --port 8061
+or, without reload and with several worker processes:
+  python main.py
+CoinGecko calls are capped app-wide at COINGECKO_MAX_CALLS_PER_MIN (default 30),
+split evenly between the WEB_CONCURRENCY workers.
 Open:
   UI:   http://127.0.0.1:8061/
   Docs: http://127.0.0.1:8061/docs
@@ -32,39 +61,273 @@ Open:
 
 COINGECKO_BASE = "https://api.coingecko.com/api/v3"
 
-app = FastAPI(title="CoinGecko Web", openapi_url="/openapi.json")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="CoinGecko Web", openapi_url="/openapi.json", default_response_class=_JSONResponse)
+
+# gzip JSON/CSV bodies over 1 KB; level 1 keeps most of the ratio at a fraction of the CPU
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=1)
 
 app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Cache: (key) -> (timestamp, data)
-_cache: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+# One pooled HTTP/2 client shared by all requests (created on startup)
+_client: Optional[httpx.AsyncClient] = None
+# Cache warm-up started on startup, runs while the worker already serves requests
+_warmup: Optional["asyncio.Task[Any]"] = None
+
+
+@app.on_event("startup")
+async def _startup() -> None:
+    global _client, _warmup
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        retries=2,  # reconnect on dropped keep-alive / connect errors
+    )
+    _client = httpx.AsyncClient(
+        base_url=COINGECKO_BASE,
+        transport=transport,
+        timeout=20,
+        headers={"Accept": "application/json"},
+    )
+    _warmup = asyncio.create_task(_warm())
+
+
+async def _warm() -> None:
+    # fill what the index page embeds, so the first visitors get cache hits;
+    # best effort only: a failure here just means the first requests go upstream
+    try:
+        await asyncio.gather(fetch_coin_ids(), fetch_top("usd", INDEX_TOP_PER_PAGE, 1))
+    except Exception:
+        logger.warning("cache warm-up failed", exc_info=True)
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    if _warmup is not None:
+        _warmup.cancel()
+    if _client is not None:
+        await _client.aclose()
+
+
+# Cache: (key) -> (timestamp, data, encoded JSON of a cache hit or None, upstream ETag or None),
+# bounded LRU (oldest entries evicted first)
+_cache: "OrderedDict[Tuple[str, str], Tuple[float, Any, Optional[bytes], Optional[str]]]" = OrderedDict()
 TTL_SECONDS = 30
+HIST_TTL_SECONDS = 300  # past prices barely change, keep history longer
+IDS_TTL_SECONDS = 3600  # the set of top coin ids changes slowly
+CACHE_MAX_ITEMS = 1024
+STALE_SECONDS = 300  # after TTL, serve the old value this long while refreshing
+
+# Background refreshes in progress: (key) -> task
+_refreshing: Dict[Tuple[str, str], "asyncio.Task[Any]"] = {}
+# Upstream fetches in progress: (key) -> task
+_inflight: Dict[Tuple[str, str], "asyncio.Future[Any]"] = {}
+
+
+def _cache_ttl(key: Tuple[str, str]) -> int:
+    if key[0] == "ids":
+        return IDS_TTL_SECONDS
+    return HIST_TTL_SECONDS if key[0] == "hist" else TTL_SECONDS
 
 
 def _cache_get(key: Tuple[str, str]) -> Optional[Any]:
-    now = time.time()
-    if key in _cache:
-        ts, data = _cache[key]
-        if now - ts < TTL_SECONDS:
-            return data
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    ts, data, _, _ = entry
+    age = time.time() - ts
+    if age >= _cache_ttl(key):
+        if age >= _cache_ttl(key) + STALE_SECONDS:
+            del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return data
+
+
+def _cache_get_stale(key: Tuple[str, str]) -> Optional[Any]:
+    # expired but still within the stale window
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    ts, data, _, _ = entry
+    if time.time() - ts < _cache_ttl(key) + STALE_SECONDS:
+        return data
+    return None
+
+
+def _schedule_refresh(key: Tuple[str, str], refresh: Callable[[], Awaitable[Any]]) -> None:
+    # at most one refresh per key at a time
+    if key in _refreshing:
+        return
+    task = asyncio.create_task(refresh())
+    _refreshing[key] = task
+    task.add_done_callback(lambda t: _refresh_done(key, t))
+
+
+def _refresh_done(key: Tuple[str, str], task: "asyncio.Task[Any]") -> None:
+    _refreshing.pop(key, None)
+    # nobody awaits a background refresh, so report its failure here
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("background refresh of %s failed", key, exc_info=task.exception())
+
+
+def _cache_set(key: Tuple[str, str], data: Any, etag: Optional[str] = None, ts: Optional[float] = None) -> None:
+    # ts: age of the source data when `data` is derived from another entry
+    _cache[key] = (time.time() if ts is None else ts, data, None, etag)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_MAX_ITEMS:
+        _cache.popitem(last=False)
+
+
+def _cache_touch(key: Tuple[str, str]) -> Optional[Any]:
+    # upstream answered 304 Not Modified: keep the data, restart its TTL
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    _, data, blob, etag = entry
+    _cache[key] = (time.time(), data, blob, etag)
+    _cache.move_to_end(key)
+    return data
+
+
+def _etag_headers(key: Tuple[str, str]) -> Dict[str, str]:
+    entry = _cache.get(key)
+    if entry is None or entry[3] is None:
+        return {}
+    return {"If-None-Match": entry[3]}
+
+
+def _set_cache_control(response: Response, key: Tuple[str, str]) -> None:
+    # let the browser reuse the answer for as long as our copy stays fresh
+    entry = _cache.get(key)
+    if entry is None:
+        return
+    max_age = int(_cache_ttl(key) - (time.time() - entry[0]))
+    if max_age > 0:
+        response.headers["Cache-Control"] = f"public, max-age={max_age}"
+
+
+def _cached_json(key: Tuple[str, str]) -> Optional[Response]:
+    # fresh hit as a ready-made response; encoded once, then reused as is
+    entry = _cache.get(key)
+    if entry is None or time.time() - entry[0] >= _cache_ttl(key):
+        return None
+    ts, data, blob, etag = entry
+    if blob is None:
+        blob = _json_dumps({"cached": True, **data})
+        _cache[key] = (ts, data, blob, etag)
+    _cache.move_to_end(key)
+    response = Response(content=blob, media_type="application/json")
+    _set_cache_control(response, key)
+    return response
+
+
+def _top_key(vs: str, per_page: int, page: int) -> Tuple[str, str]:
+    return ("top", f"{(vs or 'usd').lower()}:{per_page}:{page}")
+
+
+def _price_key(coin_id: str, vs: str) -> Tuple[str, str]:
+    coin_id = (coin_id or "").strip().lower()
+    vs = (vs or "usd").strip().lower()
+    return ("price", f"{coin_id}:{vs}")
+
+
+def _hist_key(coin_id: str, vs: str, unix_from: int, unix_to: int) -> Tuple[str, str]:
+    coin_id = (coin_id or "").strip().lower()
+    vs = (vs or "usd").strip().lower()
+    return ("hist", f"{coin_id}:{vs}:{unix_from}:{unix_to}")
+
+
+def _single_flight_done(key: Tuple[str, str], task: "asyncio.Future[Any]") -> None:
+    _inflight.pop(key, None)
+    # mark the error as seen: if every awaiting caller went away, nobody else will
+    if not task.cancelled():
+        task.exception()
+
+
+async def _single_flight(key: Tuple[str, str], load: Callable[[], Awaitable[Any]]) -> Any:
+    # concurrent callers with the same key share one upstream request
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(load())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _single_flight_done(key, t))
+    # shield: a disconnected client must not cancel the fetch for the others
+    return await asyncio.shield(task)
+
+
+# Self-throttling towards CoinGecko (the free tier allows only a few dozen calls a minute).
+# The budget is for the whole app; each worker process gets its share, worker count
+# taken from WEB_CONCURRENCY (what uvicorn itself uses as its --workers default).
+WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY") or 1))
+UPSTREAM_CONCURRENCY = max(1, int(os.environ.get("COINGECKO_MAX_CONCURRENCY") or 5) // WORKERS)
+UPSTREAM_MAX_CALLS = max(1, int(os.environ.get("COINGECKO_MAX_CALLS_PER_MIN") or 30) // WORKERS)
+UPSTREAM_WINDOW_SECONDS = 60
+RATE_LIMIT_COOLDOWN = 10  # seconds to back off after a 429 without Retry-After
+_upstream_sem = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+_upstream_calls: Deque[float] = deque()  # monotonic times of recent upstream calls
+_upstream_blocked_until = 0.0
+
+
+@asynccontextmanager
+async def _upstream_slot() -> AsyncIterator[None]:
+    # waits instead of bursting past CoinGecko's limits
+    async with _upstream_sem:
+        while True:
+            now = time.monotonic()
+            while _upstream_calls and now - _upstream_calls[0] >= UPSTREAM_WINDOW_SECONDS:
+                _upstream_calls.popleft()
+            if _upstream_blocked_until > now:
+                wait = _upstream_blocked_until - now
+            elif len(_upstream_calls) >= UPSTREAM_MAX_CALLS:
+                wait = UPSTREAM_WINDOW_SECONDS - (now - _upstream_calls[0])
+            else:
+                break
+            await asyncio.sleep(wait)
+        _upstream_calls.append(now)
+        yield
+
+
+def _upstream_cooldown() -> Optional[Dict[str, Any]]:
+    # after a 429, new misses fail fast instead of queueing up more calls
+    left = _upstream_blocked_until - time.monotonic()
+    if left > 0:
+        return {"error": "CoinGecko rate limit, try again shortly", "retry_after": round(left, 1)}
     return None
 
 
-def _cache_set(key: Tuple[str, str], data: Any) -> None:
-    _cache[key] = (time.time(), data)
+def _note_rate_limit(r: httpx.Response) -> None:
+    global _upstream_blocked_until
+    if r.status_code != 429:
+        return
+    try:
+        wait = float(r.headers.get("retry-after") or RATE_LIMIT_COOLDOWN)
+    except ValueError:
+        wait = RATE_LIMIT_COOLDOWN
+    _upstream_blocked_until = time.monotonic() + min(wait, UPSTREAM_WINDOW_SECONDS)
 
 
-def fetch_top(vs: str, per_page: int, page: int) -> Dict[str, Any]:
+async def fetch_top(vs: str, per_page: int, page: int, allow_stale: bool = True) -> Dict[str, Any]:
     vs = (vs or "usd").lower()
     per_page = max(1, min(int(per_page), 250))
     page = max(1, int(page))
 
-    ck = ("top", f"{vs}:{per_page}:{page}")
+    ck = _top_key(vs, per_page, page)
     cached = _cache_get(ck)
     if cached is not None:
         return {"cached": True, **cached}
+    if allow_stale:
+        stale = _cache_get_stale(ck)
+        if stale is not None:
+            _schedule_refresh(ck, lambda: fetch_top(vs, per_page, page, allow_stale=False))
+            return {"cached": True, **stale}
+
+    return await _single_flight(ck, lambda: _load_top(ck, vs, per_page, page))
 
+
+async def _load_top(ck: Tuple[str, str], vs: str, per_page: int, page: int) -> Dict[str, Any]:
     params = {
         "vs_currency": vs,
         "order": "market_cap_desc",
@@ -74,10 +337,21 @@ def fetch_top(vs: str, per_page: int, page: int) -> Dict[str, Any]:
         "price_change_percentage": "24h",
     }
 
+    blocked = _upstream_cooldown()
+    if blocked is not None:
+        return blocked
+
     try:
-        r = requests.get(f"{COINGECKO_BASE}/coins/markets", params=params, timeout=20)
+        async with _upstream_slot():
+            r = await _client.get("/coins/markets", params=params, headers=_etag_headers(ck))
     except Exception as e:
         return {"error": f"Network error: {e}"}
+    _note_rate_limit(r)
+
+    if r.status_code == 304:
+        unchanged = _cache_touch(ck)
+        if unchanged is not None:
+            return unchanged
 
     if r.status_code != 200:
         return {"error": f"CoinGecko returned {r.status_code}", "details": r.text[:300]}
@@ -85,48 +359,74 @@ def fetch_top(vs: str, per_page: int, page: int) -> Dict[str, Any]:
     if "json" not in (r.headers.get("content-type") or "").lower():
         return {"error": "Not a JSON response from CoinGecko", "details": r.text[:300]}
 
-    rows = r.json()
-    items: List[Dict[str, Any]] = []
-    for x in rows:
-        items.append(
-            {
-                "market_cap_rank": x.get("market_cap_rank"),
-                "id": x.get("id"),
-                "symbol": x.get("symbol"),
-                "name": x.get("name"),
-                "current_price": x.get("current_price"),
-                "market_cap": x.get("market_cap"),
-                "price_change_percentage_24h": x.get("price_change_percentage_24h"),
-            }
-        )
+    try:
+        rows = _json_loads(r.content)
+    except ValueError as e:
+        return {"error": "Malformed JSON response from CoinGecko", "details": str(e)[:300]}
+    if not isinstance(rows, list) or not all(isinstance(x, dict) for x in rows):
+        return {"error": "Malformed JSON response from CoinGecko", "details": r.text[:300]}
+
+    # literal dict per row: measurably faster than a comprehension over a key tuple
+    items = [
+        {
+            "market_cap_rank": x.get("market_cap_rank"),
+            "id": x.get("id"),
+            "symbol": x.get("symbol"),
+            "name": x.get("name"),
+            "current_price": x.get("current_price"),
+            "market_cap": x.get("market_cap"),
+            "price_change_percentage_24h": x.get("price_change_percentage_24h"),
+        }
+        for x in rows
+    ]
 
     out = {"vs": vs, "page": page, "per_page": per_page, "count": len(items), "items": items}
-    _cache_set(ck, out)
+    _cache_set(ck, out, r.headers.get("etag"))
     return out
 
 
-def fetch_price(coin_id: str, vs: str, include_24h_change: bool = False) -> Dict[str, Any]:
+async def fetch_price(coin_id: str, vs: str, allow_stale: bool = True) -> Dict[str, Any]:
     coin_id = (coin_id or "").strip().lower()
     vs = (vs or "usd").strip().lower()
     if not coin_id:
         return {"error": "coin_id is required"}
 
-    ck = ("price", f"{coin_id}:{vs}:{int(include_24h_change)}")
+    ck = _price_key(coin_id, vs)
     cached = _cache_get(ck)
     if cached is not None:
         return {"cached": True, **cached}
+    if allow_stale:
+        stale = _cache_get_stale(ck)
+        if stale is not None:
+            _schedule_refresh(ck, lambda: fetch_price(coin_id, vs, allow_stale=False))
+            return {"cached": True, **stale}
+
+    return await _single_flight(ck, lambda: _load_price(ck, coin_id, vs))
 
+
+async def _load_price(ck: Tuple[str, str], coin_id: str, vs: str) -> Dict[str, Any]:
     params = {
         "ids": coin_id,
         "vs_currencies": vs,
         "include_last_updated_at": "true",
-        "include_24hr_change": "true" if include_24h_change else "false",
+        "include_24hr_change": "true",  # same call either way, so one cache entry serves both
     }
 
+    blocked = _upstream_cooldown()
+    if blocked is not None:
+        return blocked
+
     try:
-        r = requests.get(f"{COINGECKO_BASE}/simple/price", params=params, timeout=20)
+        async with _upstream_slot():
+            r = await _client.get("/simple/price", params=params, headers=_etag_headers(ck))
     except Exception as e:
         return {"error": f"Network error: {e}"}
+    _note_rate_limit(r)
+
+    if r.status_code == 304:
+        unchanged = _cache_touch(ck)
+        if unchanged is not None:
+            return unchanged
 
     if r.status_code != 200:
         return {"error": f"CoinGecko returned {r.status_code}", "details": r.text[:300]}
@@ -134,29 +434,177 @@ def fetch_price(coin_id: str, vs: str, include_24h_change: bool = False) -> Dict
     if "json" not in (r.headers.get("content-type") or "").lower():
         return {"error": "Not a JSON response from CoinGecko", "details": r.text[:300]}
 
-    data = r.json()
-    if coin_id not in data or vs not in data[coin_id]:
+    try:
+        data = _json_loads(r.content)
+    except ValueError as e:
+        return {"error": "Malformed JSON response from CoinGecko", "details": str(e)[:300]}
+    if not isinstance(data, dict):
+        return {"error": "Malformed JSON response from CoinGecko", "details": r.text[:300]}
+
+    out = _price_out(data, coin_id, vs)
+    if out is None:
         return {"error": "No price found (check coin_id and vs currency)", "coin_id": coin_id, "vs": vs}
 
-    out = {
+    _cache_set(ck, out, r.headers.get("etag"))
+    return out
+
+
+def _price_out(data: Dict[str, Any], coin_id: str, vs: str) -> Optional[Dict[str, Any]]:
+    if not isinstance(data.get(coin_id), dict) or vs not in data[coin_id]:
+        return None
+    return {
         "coin_id": coin_id,
         "vs": vs,
         "price": data[coin_id][vs],
         "last_updated_at": data[coin_id].get("last_updated_at"),
+        "change_24h": data[coin_id].get(f"{vs}_24h_change"),
     }
-    if include_24h_change:
-        out["change_24h"] = data[coin_id].get(f"{vs}_24h_change")
 
-    _cache_set(ck, out)
-    return out
+
+PRICES_MAX_IDS = 50  # ids per /cg/prices call, keeps the upstream URL bounded
+
+
+async def fetch_prices(coin_ids: List[str], vs: str) -> Dict[str, Any]:
+    vs = (vs or "usd").strip().lower()
+    coin_ids = list(dict.fromkeys(c.strip().lower() for c in coin_ids if c.strip()))
+    if not coin_ids:
+        return {"error": "ids is required (comma-separated coin ids)"}
+    if len(coin_ids) > PRICES_MAX_IDS:
+        return {"error": f"too many ids (at most {PRICES_MAX_IDS} per request)"}
+
+    # reuse the per-coin entries of fetch_price, ask CoinGecko only for the rest
+    prices: Dict[str, Any] = {}
+    misses: List[str] = []
+    for coin_id in coin_ids:
+        cached = _cache_get(_price_key(coin_id, vs))
+        if cached is not None:
+            prices[coin_id] = {"cached": True, **cached}
+        else:
+            misses.append(coin_id)
+
+    if misses:
+        ck = ("prices", f"{','.join(sorted(misses))}:{vs}")
+        loaded = await _single_flight(ck, lambda: _load_prices(misses, vs))
+        for coin_id in misses:
+            if "error" in loaded:
+                # the upstream call failed: only the misses get its error, the hits stay
+                prices[coin_id] = {**loaded, "coin_id": coin_id, "vs": vs}
+            else:
+                prices[coin_id] = loaded["prices"].get(coin_id) or {
+                    "error": "No price found (check coin_id and vs currency)",
+                    "coin_id": coin_id,
+                    "vs": vs,
+                }
+
+    prices = {c: prices[c] for c in coin_ids}
+    return {"vs": vs, "count": len(prices), "prices": prices}
+
+
+async def _load_prices(coin_ids: List[str], vs: str) -> Dict[str, Any]:
+    # one /simple/price call for all ids; results are cached per coin
+    params = {
+        "ids": ",".join(coin_ids),
+        "vs_currencies": vs,
+        "include_last_updated_at": "true",
+        "include_24hr_change": "true",
+    }
+
+    blocked = _upstream_cooldown()
+    if blocked is not None:
+        return blocked
+
+    try:
+        async with _upstream_slot():
+            r = await _client.get("/simple/price", params=params)
+    except Exception as e:
+        return {"error": f"Network error: {e}"}
+    _note_rate_limit(r)
+
+    if r.status_code != 200:
+        return {"error": f"CoinGecko returned {r.status_code}", "details": r.text[:300]}
+
+    if "json" not in (r.headers.get("content-type") or "").lower():
+        return {"error": "Not a JSON response from CoinGecko", "details": r.text[:300]}
+
+    try:
+        data = _json_loads(r.content)
+    except ValueError as e:
+        return {"error": "Malformed JSON response from CoinGecko", "details": str(e)[:300]}
+    if not isinstance(data, dict):
+        return {"error": "Malformed JSON response from CoinGecko", "details": r.text[:300]}
+
+    prices: Dict[str, Any] = {}
+    for coin_id in coin_ids:
+        out = _price_out(data, coin_id, vs)
+        if out is not None:
+            _cache_set(_price_key(coin_id, vs), out)
+            prices[coin_id] = out
+    return {"prices": prices}
 
 
 def _parse_iso_date(date_iso: str) -> datetime:
     # expects YYYY-MM-DD
-    return datetime.strptime(date_iso, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    # date.fromisoformat rejects times and UTC offsets, unlike datetime.fromisoformat
+    return datetime.combine(date.fromisoformat(date_iso), datetime.min.time(), tzinfo=timezone.utc)
+
+
+def _hist_range(date_from: str, date_to: str) -> Tuple[int, int]:
+    dt_from = _parse_iso_date(date_from)
+    dt_to = _parse_iso_date(date_to)
+    if dt_to < dt_from:
+        dt_from, dt_to = dt_to, dt_from
+
+    # CoinGecko range endpoint expects unix seconds
+    unix_from = int(dt_from.timestamp())
+    # include whole 'to' day
+    unix_to = int(dt_to.timestamp()) + 24 * 3600 - 1
+    return unix_from, unix_to
+
 
+# UTC day number (days since 1970-01-01) -> "YYYY-MM-DD"; at most one entry per calendar day
+_day_cache: Dict[int, str] = {}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
-def fetch_history_range(coin_id: str, vs: str, date_from: str, date_to: str) -> Dict[str, Any]:
+
+def _day_str(day_idx: int) -> str:
+    s = _day_cache.get(day_idx)
+    if s is None:
+        s = (_EPOCH + timedelta(days=day_idx)).strftime("%Y-%m-%d")
+        _day_cache[day_idx] = s
+    return s
+
+
+def _add_day_prices(by_day: Dict[str, float], prices: List[Any]) -> None:
+    # de-duplicate by date (keep last of day)
+    for ms, price in prices:
+        try:
+            by_day[_day_str(int(ms) // 86_400_000)] = float(price)
+        except Exception:
+            continue
+
+
+async def _read_day_prices(r: httpx.Response) -> Dict[str, float]:
+    by_day: Dict[str, float] = {}
+    if ijson is None:
+        raw = _json_loads(await r.aread())
+        _add_day_prices(by_day, raw.get("prices") or [])  # [[ms, price], ...]
+        return by_day
+
+    # parse "prices" incrementally, so the whole array is never held in memory
+    pairs = ijson.sendable_list()
+    coro = ijson.items_coro(pairs, "prices.item", use_float=True)
+    async for chunk in r.aiter_bytes():
+        coro.send(chunk)
+        _add_day_prices(by_day, pairs)
+        del pairs[:]
+    coro.close()
+    _add_day_prices(by_day, pairs)
+    return by_day
+
+
+async def fetch_history_range(
+    coin_id: str, vs: str, date_from: str, date_to: str, allow_stale: bool = True
+) -> Dict[str, Any]:
     coin_id = (coin_id or "").strip().lower()
     vs = (vs or "usd").strip().lower()
     if not coin_id:
@@ -165,80 +613,177 @@ def fetch_history_range(coin_id: str, vs: str, date_from: str, date_to: str) ->
         return {"error": "date_from and date_to are required (YYYY-MM-DD)"}
 
     try:
-        dt_from = _parse_iso_date(date_from)
-        dt_to = _parse_iso_date(date_to)
+        unix_from, unix_to = _hist_range(date_from, date_to)
     except Exception:
         return {"error": "bad dates (use YYYY-MM-DD)"}
 
-    if dt_to < dt_from:
-        dt_from, dt_to = dt_to, dt_from
-
-    # CoinGecko range endpoint expects unix seconds
-    unix_from = int(dt_from.timestamp())
-    # include whole 'to' day
-    unix_to = int((dt_to + datetime.resolution).timestamp()) + 24 * 3600 - 1
-
-    ck = ("hist", f"{coin_id}:{vs}:{unix_from}:{unix_to}")
+    ck = _hist_key(coin_id, vs, unix_from, unix_to)
     cached = _cache_get(ck)
     if cached is not None:
         return {"cached": True, **cached}
+    if allow_stale:
+        stale = _cache_get_stale(ck)
+        if stale is not None:
+            _schedule_refresh(ck, lambda: fetch_history_range(coin_id, vs, date_from, date_to, allow_stale=False))
+            return {"cached": True, **stale}
+
+    return await _single_flight(ck, lambda: _load_history(ck, coin_id, vs, date_from, date_to, unix_from, unix_to))
+
+
+async def _load_history(
+    ck: Tuple[str, str], coin_id: str, vs: str, date_from: str, date_to: str, unix_from: int, unix_to: int
+) -> Dict[str, Any]:
+    blocked = _upstream_cooldown()
+    if blocked is not None:
+        return blocked
 
     params = {"vs_currency": vs, "from": unix_from, "to": unix_to}
     try:
-        r = requests.get(f"{COINGECKO_BASE}/coins/{coin_id}/market_chart/range", params=params, timeout=20)
-    except Exception as e:
+        url = f"/coins/{coin_id}/market_chart/range"
+        async with _upstream_slot(), _client.stream("GET", url, params=params, headers=_etag_headers(ck)) as r:
+            _note_rate_limit(r)
+            if r.status_code == 304:
+                unchanged = _cache_touch(ck)
+                if unchanged is not None:
+                    return unchanged
+
+            if r.status_code != 200:
+                await r.aread()
+                return {"error": f"CoinGecko returned {r.status_code}", "details": r.text[:300]}
+
+            if "json" not in (r.headers.get("content-type") or "").lower():
+                await r.aread()
+                return {"error": "Not a JSON response from CoinGecko", "details": r.text[:300]}
+
+            try:
+                by_day = await _read_day_prices(r)
+            except httpx.HTTPError:
+                raise
+            except Exception as e:  # ijson/orjson parse errors, unexpected JSON shape
+                return {"error": "Malformed JSON response from CoinGecko", "details": str(e)[:300]}
+    except httpx.HTTPError as e:
         return {"error": f"Network error: {e}"}
 
-    if r.status_code != 200:
-        return {"error": f"CoinGecko returned {r.status_code}", "details": r.text[:300]}
+    points2 = [{"date": d, "price": by_day[d]} for d in sorted(by_day)]
 
-    if "json" not in (r.headers.get("content-type") or "").lower():
-        return {"error": "Not a JSON response from CoinGecko", "details": r.text[:300]}
+    out = {"coin_id": coin_id, "vs": vs, "from": date_from, "to": date_to, "points": points2, "count": len(points2)}
+    _cache_set(ck, out, r.headers.get("etag"))
+    return out
 
-    raw = r.json()
-    prices = raw.get("prices") or []  # [[ms, price], ...]
-    points: List[Dict[str, Any]] = []
-    for ms, price in prices:
-        try:
-            dt = datetime.fromtimestamp(ms / 1000, tz=timezone.utc).date()
-            points.append({"date": dt.isoformat(), "price": float(price)})
-        except Exception:
-            continue
 
-    # de-duplicate by date (keep last of day)
-    by_day: Dict[str, float] = {}
-    for p in points:
-        by_day[p["date"]] = p["price"]
-    points2 = [{"date": d, "price": by_day[d]} for d in sorted(by_day.keys())]
+COIN_IDS_KEY = ("ids", "all")
 
-    out = {"coin_id": coin_id, "vs": vs, "from": date_from, "to": date_to, "points": points2, "count": len(points2)}
-    _cache_set(ck, out)
-    return out
+
+async def fetch_coin_ids() -> List[str]:
+    # ids only, for the UI datalist; kept much longer than market data
+    cached = _cache_get(COIN_IDS_KEY)
+    if cached is not None:
+        return cached
+    return await _single_flight(COIN_IDS_KEY, lambda: _load_coin_ids(COIN_IDS_KEY))
+
+
+async def _load_coin_ids(ck: Tuple[str, str]) -> List[str]:
+    data = await fetch_top("usd", 250, 1)
+    if "error" in data:
+        return []
+    coin_ids = [x["id"] for x in data["items"] if x.get("id")]
+    _cache_set(ck, coin_ids)
+    return coin_ids
+
+
+def _render_top_csv(data: Dict[str, Any]) -> Tuple[str, bytes]:
+    # write straight into a bytes buffer (BOM included) instead of StringIO + encode
+    import csv, io as iolib  # only the CSV export needs these
+
+    buf = iolib.BytesIO()
+    out = iolib.TextIOWrapper(buf, encoding="utf-8-sig", newline="", write_through=True)
+    w = csv.writer(out, lineterminator="\n")
+    w.writerow(["rank", "id", "symbol", "name", "price", "market_cap", "change_24h_pct"])
+    for it in data.get("items", []):
+        w.writerow(
+            [
+                it.get("market_cap_rank"),
+                it.get("id"),
+                (it.get("symbol") or "").upper(),
+                it.get("name"),
+                it.get("current_price"),
+                it.get("market_cap"),
+                it.get("price_change_percentage_24h"),
+            ]
+        )
+
+    csv_bytes = buf.getvalue()
+    out.detach()
+    fn = f'cg_top_{data.get("vs","usd")}_p{data.get("page",1)}_{data.get("per_page",0)}.csv'
+    return fn, csv_bytes
 
 
 # ===== API =====
 
 @app.get("/cg/top")
-def cg_top(vs: str = Query("usd"), per_page: int = Query(50, ge=1, le=250), page: int = Query(1, ge=1)):
-    return fetch_top(vs, per_page, page)
+async def cg_top(
+    response: Response,
+    vs: str = Query("usd"),
+    per_page: int = Query(50, ge=1, le=250),
+    page: int = Query(1, ge=1),
+):
+    ck = _top_key(vs, per_page, page)
+    hit = _cached_json(ck)
+    if hit is not None:
+        return hit
+    data = await fetch_top(vs, per_page, page)
+    _set_cache_control(response, ck)
+    return data
+
+
+@app.get("/cg/top/search")
+async def cg_top_search(q: str = Query(..., description="Part of a coin id, symbol or name"), vs: str = Query("usd")):
+    # filters the (almost always cached) top-250 in memory, no upstream call per keystroke
+    data = await fetch_top(vs, 250, 1)
+    if "error" in data:
+        return data
+    q = q.strip().lower()
+    items = [
+        it
+        for it in data["items"]
+        if q in (it.get("id") or "").lower()
+        or q in (it.get("symbol") or "").lower()
+        or q in (it.get("name") or "").lower()
+    ]
+    return {"vs": data["vs"], "q": q, "count": len(items), "items": items, "cached": data.get("cached", False)}
 
 
 @app.get("/cg/price")
-def cg_price(
+async def cg_price(
+    response: Response,
     coin_id: str = Query(..., description="CoinGecko coin id, e.g. bitcoin"),
     vs: str = Query("usd"),
-    include_24h_change: bool = Query(False),
+    include_24h_change: bool = Query(False, description="Deprecated: change_24h is always returned"),
 ):
-    return fetch_price(coin_id, vs, include_24h_change)
+    ck = _price_key(coin_id, vs)
+    hit = _cached_json(ck)
+    if hit is not None:
+        return hit
+    data = await fetch_price(coin_id, vs)
+    _set_cache_control(response, ck)
+    return data
+
+
+@app.get("/cg/prices")
+async def cg_prices(
+    ids: str = Query(..., description="Comma-separated CoinGecko coin ids, e.g. bitcoin,ethereum"),
+    vs: str = Query("usd"),
+):
+    return await fetch_prices(ids.split(","), vs)
 
 
 @app.get("/cg/convert")
-def cg_convert(
+async def cg_convert(
     coin_id: str = Query(..., description="CoinGecko coin id, e.g. bitcoin"),
     vs: str = Query("usd", description="Target currency"),
     amount: float = Query(1.0, description="How many coins to convert"),
 ):
-    price = fetch_price(coin_id, vs, include_24h_change=False)
+    price = await fetch_price(coin_id, vs)
     if "error" in price:
         return price
     rate = float(price["price"])
@@ -254,39 +799,47 @@ def cg_convert(
 
 
 @app.get("/cg/history")
-def cg_history(
+async def cg_history(
+    response: Response,
     coin_id: str = Query(..., description="CoinGecko coin id, e.g. bitcoin"),
     vs: str = Query("usd"),
     date_from: str = Query(..., description="YYYY-MM-DD"),
     date_to: str = Query(..., description="YYYY-MM-DD"),
 ):
-    return fetch_history_range(coin_id, vs, date_from, date_to)
+    try:
+        ck = _hist_key(coin_id, vs, *_hist_range(date_from, date_to))
+    except Exception:
+        return await fetch_history_range(coin_id, vs, date_from, date_to)  # reports the bad dates
+    hit = _cached_json(ck)
+    if hit is not None:
+        return hit
+    data = await fetch_history_range(coin_id, vs, date_from, date_to)
+    _set_cache_control(response, ck)
+    return data
 
 
-@app.get("/cg/top.csv")
-def cg_top_csv(vs: str = Query("usd"), per_page: int = Query(100, ge=1, le=250), page: int = Query(1, ge=1)):
-    data = fetch_top(vs, per_page, page)
-    if "error" in data:
-        return data
+@app.get("/cg/coin_ids")
+async def cg_coin_ids(response: Response):
+    coin_ids = await fetch_coin_ids()
+    _set_cache_control(response, COIN_IDS_KEY)
+    return {"count": len(coin_ids), "coin_ids": coin_ids}
 
-    out = iolib.StringIO()
-    w = csv.writer(out, lineterminator="\n")
-    w.writerow(["rank", "id", "symbol", "name", "price", "market_cap", "change_24h_pct"])
-    for it in data.get("items", []):
-        w.writerow(
-            [
-                it.get("market_cap_rank"),
-                it.get("id"),
-                (it.get("symbol") or "").upper(),
-                it.get("name"),
-                it.get("current_price"),
-                it.get("market_cap"),
-                it.get("price_change_percentage_24h"),
-            ]
-        )
 
-    csv_bytes = out.getvalue().encode("utf-8-sig")
-    fn = f'cg_top_{data.get("vs","usd")}_p{data.get("page",1)}_{data.get("per_page",0)}.csv'
+@app.get("/cg/top.csv")
+async def cg_top_csv(vs: str = Query("usd"), per_page: int = Query(100, ge=1, le=250), page: int = Query(1, ge=1)):
+    ck = ("top_csv", f"{(vs or 'usd').lower()}:{per_page}:{page}")
+    cached = _cache_get(ck)
+    if cached is None:
+        data = await fetch_top(vs, per_page, page)
+        if "error" in data:
+            return data
+        cached = _render_top_csv(data)
+        # the CSV is only as fresh as the (possibly stale) top page it was built from
+        top_entry = _cache.get(_top_key(vs, per_page, page))
+        if top_entry is not None:
+            _cache_set(ck, cached, ts=top_entry[0])
+
+    fn, csv_bytes = cached
     return Response(
         content=csv_bytes,
         media_type="text/csv; charset=utf-8",
@@ -296,16 +849,31 @@ def cg_top_csv(vs: str = Query("usd"), per_page: int = Query(100, ge=1, le=250),
 
 # ===== UI =====
 
+INDEX_TOP_PER_PAGE = 50  # matches the default "per page" value in the UI
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    # Provide a short datalist for coin ids (top 250)
-    data = fetch_top("usd", 250, 1)
-    coin_ids = []
-    if isinstance(data, dict) and "items" in data:
-        coin_ids = [x.get("id") for x in data["items"] if x.get("id")]
-    return templates.TemplateResponse("index.html", {"request": request, "coin_ids": coin_ids})
+    # Never wait for CoinGecko here: embed the coin-id datalist and the first table
+    # page only if they are already cached, otherwise the browser loads them itself
+    coin_ids = _cache_get(COIN_IDS_KEY) or []
+    top = _cache_get(_top_key("usd", INDEX_TOP_PER_PAGE, 1))
+    if top is not None:
+        top = {"cached": True, **top}
+    return templates.TemplateResponse("index.html", {"request": request, "coin_ids": coin_ids, "top": top})
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8061, log_level="info")
+    # "auto" picks uvloop + httptools (uvicorn[standard]) where they are available;
+    # every worker process keeps its own cache and HTTP client
+    workers = int(os.environ.get("WEB_CONCURRENCY") or max(2, (os.cpu_count() or 2) // 2))
+    os.environ["WEB_CONCURRENCY"] = str(workers)  # workers size their upstream share from it
+    uvicorn.run(
+        "main:app",
+        host="127.0.0.1",
+        port=8061,
+        loop="auto",
+        http="auto",
+        workers=workers,
+        log_level="info",
+    )
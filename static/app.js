@@ -73,6 +73,22 @@ function applyFilterSort(){
   renderTable(rows);
 }
 
+function showTop(data, vs, perPage){
+  allRows = (data.items || []).map(x => ({
+    market_cap_rank: x.market_cap_rank,
+    id: x.id,
+    symbol: x.symbol,
+    name: x.name,
+    current_price: x.current_price,
+    market_cap: x.market_cap,
+    price_change_percentage_24h: x.price_change_percentage_24h
+  }));
+
+  qs('#btn-export').setAttribute('href', csvHref(vs, perPage));
+  qs('#hint').textContent = data.cached ? 'кэш (меньше запросов)' : '';
+  applyFilterSort();
+}
+
 async function loadTop(){
   const vs = (qs('#vs').value || 'usd').trim().toLowerCase();
   const perPage = Math.max(1, Math.min(250, parseInt(qs('#per-page').value || '50')));
@@ -83,20 +99,7 @@ async function loadTop(){
     const resp = await fetch(`/cg/top?vs=${encodeURIComponent(vs)}&per_page=${perPage}&page=1`);
     const data = await resp.json();
     if (data.error) throw new Error(data.error);
-
-    allRows = (data.items || []).map(x => ({
-      market_cap_rank: x.market_cap_rank,
-      id: x.id,
-      symbol: x.symbol,
-      name: x.name,
-      current_price: x.current_price,
-      market_cap: x.market_cap,
-      price_change_percentage_24h: x.price_change_percentage_24h
-    }));
-
-    qs('#btn-export').setAttribute('href', csvHref(vs, perPage));
-    qs('#hint').textContent = data.cached ? 'кэш (меньше запросов)' : '';
-    applyFilterSort();
+    showTop(data, vs, perPage);
   }catch(e){
     renderTable([]);
     showToast('Ошибка: ' + e.message, true);
@@ -137,6 +140,22 @@ async function doConvert(){
   }
 }
 
+async function loadCoinIds(){
+  try{
+    const resp = await fetch('/cg/coin_ids');
+    const data = await resp.json();
+    if (data.error) return;
+    const list = qs('#coin-ids');
+    list.replaceChildren(...(data.coin_ids || []).map(id => {
+      const opt = document.createElement('option');
+      opt.value = id;
+      return opt;
+    }));
+  }catch(e){
+    // the datalist is only a hint, inputs still work without it
+  }
+}
+
 function debounce(fn, ms=250){ let t; return (...a)=>{ clearTimeout(t); t=setTimeout(()=>fn(...a), ms) } }
 
 function toggleTheme(){
@@ -342,5 +361,12 @@ window.addEventListener('DOMContentLoaded', () => {
   qs('#hist-from').value = from;
   qs('#hist-to').value = to;
 
-  loadTop();
+  // the first page is rendered into the template by the server
+  const initial = window.INITIAL_TOP;
+  if (initial && initial.vs === qs('#vs').value && String(initial.per_page) === qs('#per-page').value){
+    showTop(initial, initial.vs, initial.per_page);
+  } else {
+    loadTop();
+  }
+  if (!qs('#coin-ids').options.length) loadCoinIds();
 });